@@ -32,25 +32,172 @@ Real-world analogy:
     to be searched later
 """
 from __future__ import annotations
-from collections.abc import Iterable, Iterator
-from typing import List, Any
+import queue
+import random
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Iterable, Iterator, Sequence
+from heapq import merge
+from typing import List, Any, Optional
+
+# sorts after every character, so `prefix + _MAX_CHAR` bounds all words
+# starting with `prefix`
+_MAX_CHAR = chr(sys.maxunicode)
+
+
+class PackedWords(Sequence):
+    """
+    A compact storage backend for WordsCollection: words are stored back to
+    back in one UTF-8 buffer and located through an offsets array, so
+    there is no per-word Python object. A `str` is only created when an
+    element is read.
+
+    With `dedup=True`, repeated words are stored once. This keeps a dict of
+    the distinct words, so it only pays off when there are few of them.
+    """
+    def __init__(self, words: Iterable[str] = (), dedup: bool = False) -> None:
+        self._buffer = bytearray()
+        # offsets of the stored words, plus the end of the last one
+        self._offsets = array("Q", [0])
+        # with dedup, position -> index of the stored word
+        self._refs = array("I") if dedup else None
+        self._ids = {} if dedup else None
+        for word in words:
+            self.append(word)
+
+    def append(self, word: str) -> None:
+        if self._ids is not None:
+            word_id = self._ids.setdefault(word, len(self._offsets) - 1)
+            self._refs.append(word_id)
+            if word_id != len(self._offsets) - 1:
+                return
+        self._buffer += word.encode()
+        self._offsets.append(len(self._buffer))
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1 if self._refs is None else len(self._refs)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if self._refs is not None:
+            word_id = self._refs[index]
+        elif index < 0:
+            word_id = index + len(self)
+        else:
+            word_id = index
+        if not 0 <= word_id < len(self._offsets) - 1:
+            raise IndexError("PackedWords index out of range")
+        return self._buffer[self._offsets[word_id]:self._offsets[word_id + 1]].decode()
+
+    def nbytes(self) -> int:
+        size = len(self._buffer) + self._offsets.itemsize * len(self._offsets)
+        if self._refs is not None:
+            size += self._refs.itemsize * len(self._refs)
+        return size
+
+
+class SortedView(Sequence):
+    """
+    The alphabetical order of a compact backend, kept as an array of
+    positions instead of a list of words.
+
+    The order is built by sorting runs of `run_size` positions and merging
+    them, so only one run of words is decoded at a time rather than the
+    whole backend.
+    """
+    run_size = 65536
+
+    def __init__(self, words: Sequence) -> None:
+        self._words = words
+        key = words.__getitem__
+        runs = [array("I", sorted(range(start, min(start + self.run_size, len(words))), key=key))
+                for start in range(0, len(words), self.run_size)]
+        # merge is stable across runs, so equal words keep their positions' order
+        self._order = array("I", merge(*runs, key=key))
+
+    def add(self, position: int) -> None:
+        """
+        Index the word just stored at `position`.
+        """
+        self._order.insert(bisect_right(self, self._words[position]), position)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            words = self._words
+            return [words[i] for i in self._order[index]]
+        return self._words[self._order[index]]
+
+    def nbytes(self) -> int:
+        return self._order.itemsize * len(self._order)
 
 
 class WordsCollection(Iterable):
-    def __init__(self, collection: List[Any] = []) -> None:
-        self._collection = collection
+    def __init__(self, collection: Optional[List[Any]] = None,
+                 storage: Optional[PackedWords] = None) -> None:
+        """
+        `storage` replaces the default list backend, e.g. with PackedWords
+        for very large collections; `collection` is then copied into it.
+        """
+        if storage is None:
+            self._collection = [] if collection is None else collection
+            # kept sorted as items are added, so traversals never re-sort
+            self._sorted = sorted(self._collection)
+        else:
+            for item in collection or ():
+                storage.append(item)
+            self._collection = storage
+            self._sorted = SortedView(storage)
 
     def __iter__(self) -> AlphabeticalOrderIterator:
-        return AlphabeticalOrderIterator(self._collection)
+        return AlphabeticalOrderIterator(self._sorted)
 
     def get_reverse_iterator(self) -> AlphabeticalOrderIterator:
-        return AlphabeticalOrderIterator(self._collection, True)
+        return AlphabeticalOrderIterator(self._sorted, True)
+
+    def range(self, low: Any = None, high: Any = None,
+              reverse: bool = False) -> AlphabeticalOrderIterator:
+        """
+        Iterate over the words w with low <= w < high in O(log n) to
+        find the bounds; either bound may be omitted.
+        """
+        start = 0 if low is None else bisect_left(self._sorted, low)
+        stop = len(self._sorted) if high is None else bisect_left(self._sorted, high)
+        return AlphabeticalOrderIterator(self._sorted, reverse, start, stop)
+
+    def prefix(self, prefix: str, reverse: bool = False) -> AlphabeticalOrderIterator:
+        return self.range(prefix, prefix + _MAX_CHAR, reverse)
+
+    def iter_chunks(self, size: int, reverse: bool = False) -> Iterator[List[Any]]:
+        """
+        Yield the words in alphabetical order as lists of up to `size`.
+        """
+        iterator = AlphabeticalOrderIterator(self._sorted, reverse)
+        batch = iterator.next_batch(size)
+        while batch:
+            yield batch
+            batch = iterator.next_batch(size)
 
     def add_item(self, item: Any):
         self._collection.append(item)
+        if isinstance(self._sorted, SortedView):
+            self._sorted.add(len(self._collection) - 1)
+        else:
+            insort(self._sorted, item)
 
 
 class AlphabeticalOrderIterator(Iterator):
+    """
+    Walks a sorted list between `start` and `stop`, forwards or backwards.
+    Besides plain iteration it can jump to a prefix with `seek` and be
+    indexed or sliced lazily, relative to its traversal direction.
+    """
     # _position is used to store the current traversal position.
     # It depends on the particular type of collection, we might
     # have other fields for storing iteration state.
@@ -58,11 +205,13 @@ class AlphabeticalOrderIterator(Iterator):
     # this attribute controls the traversal direction
     _reverse: bool = False
 
-    def __init__(self, collection: WordsCollection,
-                 reverse: bool = False) -> None:
+    def __init__(self, collection: List[Any], reverse: bool = False,
+                 start: int = 0, stop: Optional[int] = None) -> None:
         self._collection = collection
         self._reverse = reverse
-        self._position = -1 if reverse else 0
+        self._start = start
+        self._stop = len(collection) if stop is None else stop
+        self._position = self._stop - 1 if reverse else start
 
     def __next__(self):
         """
@@ -70,36 +219,302 @@ class AlphabeticalOrderIterator(Iterator):
         elements of the collection. The client can keep running this
         method until it does not return anything.
         """
-        try:
-            value = self._collection[self._position]
-            self._position += -1 if self._reverse else 1
-        except IndexError:
+        position = self._position
+        if not self._start <= position < self._stop:
             raise StopIteration
-        return value
+        self._position = position - 1 if self._reverse else position + 1
+        return self._collection[position]
+
+    def __len__(self) -> int:
+        """
+        The number of elements left to traverse.
+        """
+        if self._reverse:
+            return max(self._position - self._start + 1, 0)
+        return max(self._stop - self._position, 0)
+
+    def __getitem__(self, index):
+        """
+        Index or slice the remaining elements; a slice gives a new iterator
+        and does not copy anything.
+        """
+        length = len(self)
+        if isinstance(index, slice):
+            begin, end, step = index.indices(length)
+            if step != 1:
+                raise ValueError("only contiguous slices are supported")
+            end = max(begin, end)
+            if self._reverse:
+                return AlphabeticalOrderIterator(self._collection, True,
+                                                 self._position - end + 1,
+                                                 self._position - begin + 1)
+            return AlphabeticalOrderIterator(self._collection, False,
+                                             self._position + begin,
+                                             self._position + end)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("iterator index out of range")
+        offset = -index if self._reverse else index
+        return self._collection[self._position + offset]
+
+    def next_batch(self, n: int) -> List[Any]:
+        """
+        Fetch up to n elements at once with a single slice; an empty list
+        means the iterator is exhausted.
+        """
+        n = min(n, len(self))
+        if n <= 0:
+            return []
+        position = self._position
+        if self._reverse:
+            self._position = position - n
+            return self._collection[position - n + 1:position + 1][::-1]
+        self._position = position + n
+        return self._collection[position:position + n]
+
+    def seek(self, prefix: str) -> AlphabeticalOrderIterator:
+        """
+        Move to the first word >= prefix, or when reversed to the last
+        word starting with prefix or sorting before it. O(log n).
+        """
+        if self._reverse:
+            position = bisect_right(self._collection, prefix + _MAX_CHAR,
+                                    self._start, self._stop) - 1
+        else:
+            position = bisect_left(self._collection, prefix, self._start, self._stop)
+        self._position = position
+        return self
 
 
 class ListNode:
+    # no per-node __dict__, which makes every node considerably smaller
+    __slots__ = ("val", "next_")
+
     def __init__(self, val):
         self.val = val
         self.next_ = None
 
 
 class LinkedList:
-    def __init__(self, head):
+    """
+    A singly linked list with a tail pointer, so `append` is O(1). The
+    length and tail are worked out once when it is built from a chain of
+    nodes; link further nodes through `append` to keep them right.
+    """
+    def __init__(self, head=None):
         self.head = head
-        self.cur = None
+        self.tail = None
+        self._length = 0
+        node = head
+        while node is not None:
+            self.tail = node
+            self._length += 1
+            node = node.next_
+
+    @classmethod
+    def from_iterable(cls, vals):
+        linkedlist = cls()
+        for val in vals:
+            linkedlist.append(val)
+        return linkedlist
+
+    def append(self, val):
+        node = ListNode(val)
+        if self.tail is None:
+            self.head = node
+        else:
+            self.tail.next_ = node
+        self.tail = node
+        self._length += 1
+
+    def __len__(self):
+        return self._length
 
     def __iter__(self):
-        self.cur = self.head
-        return self
+        # every traversal gets its own cursor, so nested loops don't interfere
+        return LinkedListIterator(self.head)
+
+    def iter_chunks(self, size):
+        iterator = iter(self)
+        batch = iterator.next_batch(size)
+        while batch:
+            yield batch
+            batch = iterator.next_batch(size)
+
+
+class LinkedListIterator(Iterator):
+    def __init__(self, head):
+        self._cur = head
 
     def __next__(self):
-        if self.cur:
-            val = self.cur.val
-            self.cur = self.cur.next_
-            return val
-        else:
+        cur = self._cur
+        if cur is None:
+            raise StopIteration
+        self._cur = cur.next_
+        return cur.val
+
+    def next_batch(self, n):
+        batch = []
+        append = batch.append
+        cur = self._cur
+        while cur is not None and n > 0:
+            append(cur.val)
+            cur = cur.next_
+            n -= 1
+        self._cur = cur
+        return batch
+
+
+class PrefetchingIterator(Iterator):
+    """
+    Pulls chunks from `chunks` on a background thread, keeping up to
+    `depth` of them ready, so slow storage is read while the consumer
+    works on the previous chunk. Call `close` when stopping early.
+    """
+    _done = object()
+
+    def __init__(self, chunks, depth=2):
+        self._queue = queue.Queue(depth)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._fill, args=(iter(chunks),), daemon=True)
+        self._thread.start()
+
+    def _fill(self, chunks):
+        try:
+            for chunk in chunks:
+                if not self._put(chunk):
+                    return
+        except Exception as exc:
+            self._put(exc)
+            return
+        self._put(self._done)
+
+    def _put(self, item):
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __next__(self):
+        if self._closed.is_set():
+            raise StopIteration
+        item = self._queue.get()
+        if item is self._done:
+            self._closed.set()
             raise StopIteration
+        if isinstance(item, Exception):
+            self._closed.set()
+            raise item
+        return item
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+
+
+def benchmark_sorted_index(words=10**5, passes=100):
+    """
+    Compare traversing with the incrementally kept sorted index against
+    sorting the collection again on every pass.
+    """
+    items = [f"word{random.randrange(10**9):09d}" for _ in range(words)]
+    collection = WordsCollection()
+    start = time.perf_counter()
+    for item in items:
+        collection.add_item(item)
+    print(f"building the index  {time.perf_counter() - start:.4f}s")
+    start = time.perf_counter()
+    for _ in range(passes):
+        for _ in collection:
+            pass
+    print(f"indexed traversal   {time.perf_counter() - start:.4f}s")
+    start = time.perf_counter()
+    for _ in range(passes):
+        for _ in sorted(items):
+            pass
+    print(f"sort on every pass  {time.perf_counter() - start:.4f}s")
+    start = time.perf_counter()
+    for _ in range(passes):
+        next(collection.prefix("word5"), None)
+    print(f"prefix seek         {time.perf_counter() - start:.6f}s")
+
+
+def benchmark_storage(words=10**6, distinct=10**5):
+    """
+    Report bytes per word and traversal throughput of the list backend and
+    of PackedWords, with and without deduplication.
+    """
+    items = [f"word{random.randrange(distinct):06d}" for _ in range(words)]
+    for name, storage in (("list", None), ("packed", PackedWords()),
+                          ("packed+dedup", PackedWords(dedup=True))):
+        collection = WordsCollection(list(items) if storage is None else items, storage)
+        if storage is None:
+            # the list, its sorted copy and one str object per word
+            size = (sys.getsizeof(collection._collection) + sys.getsizeof(collection._sorted)
+                    + sum(map(sys.getsizeof, items)))
+        else:
+            size = storage.nbytes() + collection._sorted.nbytes()
+            if storage._ids is not None:
+                # the dedup dict and its distinct str keys
+                size += sys.getsizeof(storage._ids) + sum(map(sys.getsizeof, storage._ids))
+        start = time.perf_counter()
+        for _ in collection:
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"{name:<13} {size / words:6.1f} bytes/word  {words / elapsed:>12,.0f} words/s")
+
+
+class _DictListNode:
+    def __init__(self, val):
+        self.val = val
+        self.next_ = None
+
+
+def benchmark_linked_list(nodes=10**6):
+    """
+    Report memory per node and traversal speed of __slots__ nodes against
+    nodes with a __dict__.
+    """
+    import tracemalloc
+
+    for node_class in (_DictListNode, ListNode):
+        tracemalloc.start()
+        head = tail = node_class(0)
+        for val in range(1, nodes):
+            tail.next_ = node_class(val)
+            tail = tail.next_
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for _ in LinkedList(head):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"{node_class.__name__:<13} {size / nodes:6.1f} bytes/node  "
+              f"{nodes / elapsed:>12,.0f} nodes/s")
+
+
+def benchmark_chunks(items=10**6, size=1024):
+    """
+    Compare draining collections element by element with draining them in
+    chunks of `size`.
+    """
+    words = WordsCollection([f"word{i:07d}" for i in range(items)])
+    linkedlist = LinkedList.from_iterable(range(items))
+    for name, collection in (("WordsCollection", words), ("LinkedList", linkedlist)):
+        start = time.perf_counter()
+        for _ in collection:
+            pass
+        per_element = time.perf_counter() - start
+        start = time.perf_counter()
+        for chunk in collection.iter_chunks(size):
+            for _ in chunk:
+                pass
+        chunked = time.perf_counter() - start
+        print(f"{name:<16} per-element {per_element:.4f}s  chunked {chunked:.4f}s")
 
 
 if __name__ == "__main__":
@@ -113,7 +528,19 @@ if __name__ == "__main__":
     print("Direct traversal")
     print("\n".join(collection))
     print("Reverse traversal:")
-    print("\n".join(collection.get_reverse_iterator()), end="")
+    print("\n".join(collection.get_reverse_iterator()))
+    print("Words starting with 'S' or later:")
+    print("\n".join(iter(collection).seek("S")))
+    print("Second word in reverse order:")
+    print(collection.get_reverse_iterator()[1])
+
+    print("Packed storage, reverse traversal:")
+    packed = WordsCollection(["First", "Second", "Third"], PackedWords())
+    packed.add_item("Fourth")
+    print("\n".join(packed.get_reverse_iterator()))
+    print("Chunks of two, prefetched:")
+    for chunk in PrefetchingIterator(packed.iter_chunks(2)):
+        print(chunk)
 
     print("=" * 78)
     print("Linked List Example")
@@ -126,3 +553,14 @@ if __name__ == "__main__":
     # iterate
     for i in linkedlist:
         print(i)
+
+    linkedlist = LinkedList.from_iterable([1, 2])
+    linkedlist.append(3)
+    print(f"{len(linkedlist)} nodes, pairs: "
+          f"{[(i, j) for i in linkedlist for j in linkedlist if i < j]}")
+
+    if "--benchmark" in sys.argv:
+        benchmark_sorted_index()
+        benchmark_storage()
+        benchmark_linked_list()
+        benchmark_chunks()
@@ -11,38 +11,421 @@ Real-world analogy:
 """
 
 
+import mmap
+import os
+import sys
+import time
 from abc import ABC, abstractmethod
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress, islice
+from multiprocessing.shared_memory import SharedMemory
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, only the per-element path is used without it
+    np = None
+
+
+def _as_ndarray(vals):
+    """
+    View array-backed input as a NumPy array without copying. Returns None
+    when the batch path cannot be used.
+    """
+    if np is None:
+        return None
+    if isinstance(vals, np.ndarray):
+        return vals
+    if isinstance(vals, array) and vals.typecode != "u":
+        return np.frombuffer(vals, dtype=vals.typecode)
+    if isinstance(vals, memoryview):
+        return np.frombuffer(vals, dtype=vals.format)
+    return None
+
+
+def _is_flat_buffer(vals):
+    """
+    True for input whose buffer holds the values back to back in one
+    dimension, so it can be copied into shared memory byte for byte.
+    """
+    try:
+        view = memoryview(vals)
+    except TypeError:
+        return False
+    return view.ndim == 1 and view.c_contiguous
+
+
+def _batch_method(strategy):
+    """
+    Return the strategy's `remove_values`, or None when it or any strategy
+    it is composed of only works one value at a time.
+    """
+    children = getattr(strategy, "strategies", ())
+    if any(_batch_method(child) is None for child in children):
+        return None
+    return getattr(strategy, "remove_values", None)
 
 
 class FilterStrategy(ABC):
+    """
+    A strategy only has to say whether a single value should be removed.
+    It may also define `remove_values(vals)`, which takes a whole NumPy
+    array and returns a boolean mask of the values to remove in one call.
+    Values picks that batch path automatically for array-backed input.
+
+    Strategies can be combined with `|` (remove if any removes), `&`
+    (remove if all remove) and `~` (invert), e.g.
+    `RemovePositiveValues() | RemoveOddValues()` filters in a single pass.
+    """
     @abstractmethod
     def remove_value(self, val):
         pass
 
+    def __or__(self, other):
+        return AnyOf(self, other)
+
+    def __and__(self, other):
+        return AllOf(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
 
 class RemovePositiveValues(FilterStrategy):
     def remove_value(self, val):
         return val >= 0
 
+    def remove_values(self, vals):
+        return vals >= 0
+
 
 class RemoveOddValues(FilterStrategy):
     def remove_value(self, val):
         return abs(val) % 2
 
+    def remove_values(self, vals):
+        return vals % 2 != 0
+
+
+class CompositeFilter(FilterStrategy):
+    """
+    Combines several strategies into one compiled predicate that stops at
+    the first decisive child. `optimize` reorders the children so that the
+    cheapest and most decisive ones, measured on a sample, run first.
+    """
+    # the child result that decides the outcome without asking the others
+    _decisive: bool = None
+
+    def __init__(self, *strategies):
+        if not strategies:
+            raise ValueError(f"{type(self).__name__} needs at least one strategy")
+        self.strategies = []
+        for strategy in strategies:
+            if type(strategy) is type(self):
+                self.strategies.extend(strategy.strategies)
+            else:
+                self.strategies.append(strategy)
+        self._compile()
+
+    def _compile(self):
+        predicates = tuple(s.remove_value for s in self.strategies)
+        decisive = self._decisive
+
+        def predicate(val):
+            for remove_value in predicates:
+                if bool(remove_value(val)) is decisive:
+                    return decisive
+            return not decisive
+
+        self._predicate = predicate
+
+    def remove_value(self, val):
+        return self._predicate(val)
+
+    def __getstate__(self):
+        # the compiled predicate is a closure and cannot be pickled
+        state = self.__dict__.copy()
+        del state["_predicate"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
+    def optimize(self, sample):
+        sample = list(sample)
+
+        def score(strategy):
+            optimize = getattr(strategy, "optimize", None)
+            if optimize is not None:
+                optimize(sample)
+            start = time.perf_counter()
+            hits = sum(bool(strategy.remove_value(val)) is self._decisive
+                       for val in sample)
+            return (time.perf_counter() - start) / (hits + 1)
+
+        self.strategies.sort(key=score)
+        self._compile()
+
+
+class AnyOf(CompositeFilter):
+    _decisive = True
+
+    def remove_values(self, vals):
+        mask = self.strategies[0].remove_values(vals)
+        for strategy in self.strategies[1:]:
+            mask = mask | strategy.remove_values(vals)
+        return mask
+
+
+class AllOf(CompositeFilter):
+    _decisive = False
+
+    def remove_values(self, vals):
+        mask = self.strategies[0].remove_values(vals)
+        for strategy in self.strategies[1:]:
+            mask = mask & strategy.remove_values(vals)
+        return mask
+
+
+class Not(FilterStrategy):
+    def __init__(self, strategy):
+        self.strategy = strategy
+
+    @property
+    def strategies(self):
+        return [self.strategy]
+
+    def remove_value(self, val):
+        return not self.strategy.remove_value(val)
+
+    def remove_values(self, vals):
+        return ~self.strategy.remove_values(vals)
+
+    def optimize(self, sample):
+        optimize = getattr(self.strategy, "optimize", None)
+        if optimize is not None:
+            optimize(sample)
+
 
 class Values:
+    # number of leading values used to measure selectivity of composite filters
+    sample_size: int = 1000
+    # number of values ifilter reads before yielding the survivors
+    chunk_size: int = 65536
+    # smallest input for which filter(..., workers=n) uses a process pool
+    parallel_threshold: int = 1_000_000
+
     def __init__(self, vals):
         self.vals = vals
 
-    def filter(self, strategy):
+    @classmethod
+    def from_binary_file(cls, path, typecode="d"):
+        """
+        Memory-map a file of packed native values (array.array typecodes).
+        Pages are loaded on demand, so the file is never read as a whole.
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(memoryview(mapped).cast(typecode))
+
+    @classmethod
+    def from_text_file(cls, path, type_=float):
+        """
+        Read one number per line lazily. Blank lines are skipped.
+        """
+        def read():
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        yield type_(line)
+        return cls(read())
+
+    def filter(self, strategy, workers=None):
+        """
+        Return the values the strategy keeps. With `workers`, 1-D
+        contiguous array-backed input of at least `parallel_threshold`
+        values is split across a process pool; the order of the result is
+        the same either way. Other input is filtered in this process.
+        """
+        if iter(self.vals) is self.vals:
+            # a one-shot iterator cannot be sampled and then filtered again
+            return [val for chunk in self.ifilter(strategy) for val in chunk]
+        self._optimize(strategy, self.vals)
+        if (workers is not None and len(self.vals) >= self.parallel_threshold
+                and _is_flat_buffer(self.vals)):
+            return self._filter_parallel(strategy, workers)
+        return self._filter(self.vals, strategy)
+
+    def ifilter(self, strategy, chunk_size=None):
+        """
+        Lazily filter any iterable, e.g. a generator, a file or a socket
+        reader. Survivors are yielded chunk by chunk, so memory use only
+        depends on the chunk size.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        vals = self.vals
+        if isinstance(vals, (array, memoryview)) or _as_ndarray(vals) is not None:
+            # slicing keeps array-backed chunks eligible for the batch path
+            chunks = (vals[i:i + chunk_size] for i in range(0, len(vals), chunk_size))
+        else:
+            it = iter(vals)
+            chunks = iter(lambda: list(islice(it, chunk_size)), [])
+        for i, chunk in enumerate(chunks):
+            if i == 0:
+                self._optimize(strategy, chunk)
+            res = self._filter(chunk, strategy)
+            if len(res):
+                yield res
+
+    def _optimize(self, strategy, vals):
+        optimize = getattr(strategy, "optimize", None)
+        if optimize is None:
+            return
+        if _batch_method(strategy) is not None and _as_ndarray(vals) is not None:
+            # the batch path evaluates every child over the whole array, so
+            # the order of the children does not matter
+            return
+        optimize(islice(vals, self.sample_size))
+
+    @staticmethod
+    def _filter(vals, strategy):
+        remove_values = _batch_method(strategy)
+        arr = _as_ndarray(vals) if remove_values is not None else None
+        if arr is not None:
+            return Values._filter_batch(vals, arr, remove_values)
         res = []
-        for val in self.vals:
+        for val in vals:
             if not strategy.remove_value(val):
                 res.append(val)
         return res
 
+    def _filter_parallel(self, strategy, workers):
+        """
+        Copy the values into shared memory once; each worker attaches to it
+        and writes a keep-mask for its slice into a second shared buffer, so
+        only segment names and slice bounds are pickled.
+        """
+        view = memoryview(self.vals)
+        n = len(view)
+        data = SharedMemory(create=True, size=max(view.nbytes, 1))
+        mask = SharedMemory(create=True, size=max(n, 1))
+        try:
+            data.buf[:view.nbytes] = view.cast("B")
+            step = -(-n // workers) or 1
+            tasks = [(data.name, mask.name, view.format, view.nbytes,
+                      start, min(start + step, n), strategy)
+                     for start in range(0, n, step)]
+            with ProcessPoolExecutor(workers) as pool:
+                list(pool.map(_filter_shared_slice, tasks))
+            keep = bytes(mask.buf[:n])
+        finally:
+            for shm in (data, mask):
+                shm.close()
+                shm.unlink()
+        # return what the serial path would: arrays only from the batch path
+        arr = _as_ndarray(self.vals) if _batch_method(strategy) is not None else None
+        if arr is not None:
+            kept = arr[np.frombuffer(keep, dtype=bool)]
+            return array(view.format, kept.tobytes()) if isinstance(self.vals, array) else kept
+        return list(compress(self.vals, keep))
+
+    @staticmethod
+    def _filter_batch(vals, arr, remove_values):
+        """
+        Drop every value masked by the strategy. array.array input gives
+        an array.array back, other array-backed input a NumPy array.
+        """
+        kept = arr[~remove_values(arr)]
+        if isinstance(vals, array):
+            return array(vals.typecode, kept.tobytes())
+        return kept
+
+
+def _filter_shared_slice(task):
+    """
+    Runs in a worker process: computes the keep-mask of one slice of the
+    values living in shared memory.
+    """
+    data_name, mask_name, fmt, nbytes, start, stop, strategy = task
+    data = SharedMemory(data_name)
+    mask = SharedMemory(mask_name)
+    try:
+        vals = data.buf[:nbytes].cast(fmt)[start:stop]
+        remove_values = _batch_method(strategy)
+        arr = _as_ndarray(vals) if remove_values is not None else None
+        if arr is not None:
+            mask.buf[start:stop] = (~remove_values(arr)).view(np.uint8)
+            del arr
+        else:
+            mask.buf[start:stop] = bytes(not strategy.remove_value(val) for val in vals)
+        vals.release()
+    finally:
+        data.close()
+        mask.close()
+
+
+def benchmark(sizes=(10**3, 10**4, 10**5, 10**6, 10**7, 10**8)):
+    """
+    Compare the per-element path (plain list) with the batch path (NumPy
+    array) for every strategy. Large sizes need a lot of memory and time.
+    """
+    if np is None:
+        print("NumPy is not installed, there is no batch path to compare.")
+        return
+    for size in sizes:
+        as_array = np.arange(-size // 2, size // 2)
+        as_list = as_array.tolist()
+        for strategy in (RemovePositiveValues(), RemoveOddValues()):
+            timings = []
+            for vals in (as_list, as_array):
+                start = time.perf_counter()
+                Values(vals).filter(strategy)
+                timings.append(time.perf_counter() - start)
+            print(f"{size:>11} {type(strategy).__name__:<22} "
+                  f"per-element {timings[0]:.4f}s  batch {timings[1]:.4f}s")
+
+
+def benchmark_parallel(size=10**7, max_workers=None):
+    """
+    Time the parallel path with 1 to `max_workers` processes against the
+    serial path on the same array.
+    """
+    max_workers = max_workers or os.cpu_count()
+    vals = np.arange(-size // 2, size // 2) if np is not None else array("q", range(-size // 2, size // 2))
+    values = Values(vals)
+    values.parallel_threshold = 0
+    strategy = RemovePositiveValues() | RemoveOddValues()
+    start = time.perf_counter()
+    values.filter(strategy)
+    print(f"serial     {time.perf_counter() - start:.4f}s")
+    for workers in range(1, max_workers + 1):
+        start = time.perf_counter()
+        values.filter(strategy, workers=workers)
+        print(f"{workers:>2} workers {time.perf_counter() - start:.4f}s")
+
 
 if __name__ == "__main__":
     values = Values([-7, -4, -1, 0, 2, 6, 9])
     print(values.filter(RemovePositiveValues()))
     print(values.filter(RemoveOddValues()))
+    print(values.filter(RemovePositiveValues() | RemoveOddValues()))
+    print(values.filter(~RemovePositiveValues() & RemoveOddValues()))
+
+    values = Values(array("q", [-7, -4, -1, 0, 2, 6, 9]))
+    print(values.filter(RemovePositiveValues()))
+    print(values.filter(RemoveOddValues()))
+    print(values.filter(RemovePositiveValues() | RemoveOddValues()))
+
+    values = Values(iter(range(-7, 10)))
+    for chunk in values.ifilter(RemoveOddValues(), chunk_size=5):
+        print(chunk)
+
+    values = Values(array("q", range(-7, 10)))
+    values.parallel_threshold = 0
+    print(values.filter(RemovePositiveValues() | RemoveOddValues(), workers=2))
+
+    if "--benchmark" in sys.argv:
+        benchmark()
+        benchmark_parallel()
@@ -42,7 +42,15 @@ Applicability:
     - consider using the abstract factory when we have a class with a set of factory methods
     that blur its primary responsibility.
 """
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
 from abc import ABC, abstractmethod
+from importlib.metadata import entry_points
 
 
 class AbstractProductA(ABC):
@@ -117,6 +125,76 @@ class ConcreteFactory2(AbstractFactory):
         return ConcreteProductB2()
 
 
+class CachedFactory(AbstractFactory):
+    """
+    Wraps a factory whose products keep no state and hands out the same
+    product on every call.
+    """
+    def __init__(self, factory: AbstractFactory) -> None:
+        self._factory = factory
+        self._product_a = None
+        self._product_b = None
+
+    def create_product_a(self) -> AbstractProductA:
+        if self._product_a is None:
+            self._product_a = self._factory.create_product_a()
+        return self._product_a
+
+    def create_product_b(self) -> AbstractProductB:
+        if self._product_b is None:
+            self._product_b = self._factory.create_product_b()
+        return self._product_b
+
+
+class FactoryRegistry:
+    """
+    Knows every factory family by name, but imports the module defining a
+    family only when that family is first requested. Families are declared
+    as "module:attribute" references, directly, through a JSON manifest or
+    through installed entry points.
+    """
+    def __init__(self, cache_products: bool = False) -> None:
+        self.cache_products = cache_products
+        self._references = {}
+        self._factories = {}
+
+    def register(self, name: str, reference: str) -> None:
+        self._references[name] = reference
+        self._factories.pop(name, None)
+
+    def load_manifest(self, path: str) -> None:
+        with open(path) as f:
+            for name, reference in json.load(f).items():
+                self.register(name, reference)
+
+    def load_entry_points(self, group: str = "design_patterns.factories") -> None:
+        for entry_point in entry_points(group=group):
+            self.register(entry_point.name, entry_point.value)
+
+    def names(self) -> list:
+        return list(self._references)
+
+    def get(self, name: str) -> AbstractFactory:
+        """
+        Return the family's factory, importing it on first use. Raises
+        KeyError for unknown families.
+        """
+        factory = self._factories.get(name)
+        if factory is None:
+            module_name, _, attribute = self._references[name].partition(":")
+            factory_class = getattr(importlib.import_module(module_name), attribute)
+            factory = factory_class()
+            if self.cache_products:
+                factory = CachedFactory(factory)
+            self._factories[name] = factory
+        return factory
+
+
+registry = FactoryRegistry()
+registry.register("family1", f"{__name__}:ConcreteFactory1")
+registry.register("family2", f"{__name__}:ConcreteFactory2")
+
+
 def client_code(factory: AbstractFactory) -> None:
     """
     The client code works with factories and products only through abstract
@@ -130,6 +208,71 @@ def client_code(factory: AbstractFactory) -> None:
     print(f"{product_b.another_useful_function_b(product_a)}", end="")
 
 
+_FAMILY_MODULE = """
+from abstract_factory_pattern import AbstractFactory, ConcreteProductA1, ConcreteProductB1
+
+# stands in for the product classes of a real family
+CATALOGUE = [("model-%d" % i, i * 1.5) for i in range(200)]
+
+
+class Factory(AbstractFactory):
+    def create_product_a(self):
+        return ConcreteProductA1()
+
+    def create_product_b(self):
+        return ConcreteProductB1()
+"""
+
+
+def benchmark_registry(families=500):
+    """
+    Compare importing `families` generated family modules eagerly with
+    registering them in a FactoryRegistry and requesting one.
+    """
+    import tracemalloc
+
+    directory = tempfile.mkdtemp()
+    saved_path = sys.path[:]
+    sys.path[:0] = [directory, os.path.dirname(os.path.abspath(__file__))]
+    manifest = {}
+    try:
+        for prefix in ("eager", "lazy"):
+            for i in range(families):
+                with open(os.path.join(directory, f"{prefix}_family_{i}.py"), "w") as f:
+                    f.write(_FAMILY_MODULE)
+                manifest[f"{prefix}{i}"] = f"{prefix}_family_{i}:Factory"
+        manifest_path = os.path.join(directory, "manifest.json")
+        with open(manifest_path, "w") as f:
+            json.dump({name: ref for name, ref in manifest.items() if name.startswith("lazy")}, f)
+        # the families import this module; when it runs as a script that is
+        # a second import, which neither timing should include
+        importlib.import_module("abstract_factory_pattern")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i in range(families):
+            importlib.import_module(f"eager_family_{i}").Factory()
+        elapsed = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"eager imports  {elapsed:.3f}s  {size / 2**20:.1f} MiB")
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        lazy_registry = FactoryRegistry()
+        lazy_registry.load_manifest(manifest_path)
+        lazy_registry.get("lazy0")
+        elapsed = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f"registry       {elapsed:.3f}s  {size / 2**20:.1f} MiB")
+    finally:
+        sys.path[:] = saved_path
+        for name in manifest.values():
+            sys.modules.pop(name.partition(":")[0], None)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
 if __name__ == "__main__":
     """
     The client code can work with any concrete factory class.
@@ -141,3 +284,12 @@ if __name__ == "__main__":
 
     print("Client: Testing the same client code with the second factory type:")
     client_code(ConcreteFactory2())
+
+    print("\n")
+
+    print("Client: Testing the client code with a family looked up by name:")
+    client_code(registry.get("family2"))
+
+    if "--benchmark" in sys.argv:
+        print("\n")
+        benchmark_registry()
@@ -35,11 +35,54 @@ Real-world analogy:
 
 
 # -- GENERIC EXAMPLE -- #
+import asyncio
+import copy
+import gc
+import inspect
+import random
+import sys
+import time
 from abc import ABC, abstractmethod
-from typing import Any
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, NamedTuple, Optional
+
+
+class ObjectPool:
+    """
+    A bounded free list of released products. Builders in pooled mode take
+    their blank products from here instead of allocating new ones; products
+    released beyond `maxsize` are left to the garbage collector.
+    """
+    def __init__(self, factory: Callable[[], Any], maxsize: int = 1024) -> None:
+        self._factory = factory
+        # id -> product; keying by id catches double releases, and popitem
+        # hands out the most recently released product first, like a stack
+        self._free = {}
+        self.maxsize = maxsize
+
+    def acquire(self) -> Any:
+        if self._free:
+            return self._free.popitem()[1]
+        return self._factory()
+
+    def release(self, product: Any) -> None:
+        """
+        Hand a product back once the client is done with it. It is reset and
+        must not be used afterwards. Releasing a product that is already in
+        the pool raises ValueError, as it would later be handed out twice.
+        """
+        key = id(product)
+        if key in self._free:
+            raise ValueError(f"{product!r} was already released")
+        if len(self._free) < self.maxsize:
+            product.reset()
+            self._free[key] = product
 
 
 class Product1:
+    __slots__ = ("parts",)
+
     def __init__(self):
         """
         The product object will have many parameters to configure. Ergo, it 
@@ -50,6 +93,9 @@ class Product1:
     def add(self, part) -> None:
         self.parts.append(part)
 
+    def reset(self) -> None:
+        self.parts.clear()
+
     def __str__(self) -> str:
         return f"Product parts: {', '.join(self.parts)}"
 
@@ -78,15 +124,19 @@ class Builder(ABC):
 
 
 class ConcreteBuilder(Builder):
-    def __init__(self):
+    def __init__(self, pool: Optional[ObjectPool] = None):
         """
         We always start with a blank product object upon which other parts are
-        built.
+        built. With a pool, blank products are reused released ones.
         """
+        self._pool = pool
         self.reset()
 
     def reset(self) -> None:
-        self._product = Product1()
+        if self._pool is None:
+            self._product = Product1()
+        else:
+            self._product = self._pool.acquire()
 
     @property
     def product(self) -> Product1:
@@ -100,6 +150,34 @@ class ConcreteBuilder(Builder):
         self.reset()
         return product
 
+    def replay(self, steps, n: int) -> list:
+        """
+        The steps always add the same parts, so run them once on a spare
+        template product and give every product of the batch a copy of the
+        resulting parts. As when the steps are replayed one product at a
+        time, parts produced before the batch only end up in the first
+        product.
+        """
+        pending = self._product
+        self.reset()
+        for step in steps:
+            getattr(self, step)()
+        template = self._product
+        parts = list(template.parts)
+        if self._pool is not None:
+            self._pool.release(template)
+        if n == 0:
+            self._product = pending
+            return []
+        pending.parts.extend(parts)
+        products = [pending]
+        for _ in range(n - 1):
+            product = Product1() if self._pool is None else self._pool.acquire()
+            product.parts.extend(parts)
+            products.append(product)
+        self.reset()
+        return products
+
     def produce_part_a(self) -> None:
         self._product.add("PartA1")
 
@@ -110,6 +188,29 @@ class ConcreteBuilder(Builder):
         self._product.add("PartC1")
 
 
+class BuildPlan:
+    """
+    An immutable sequence of builder step names recorded by a Director.
+    """
+    __slots__ = ("steps",)
+
+    def __init__(self, steps) -> None:
+        self.steps = tuple(steps)
+
+
+class _StepRecorder:
+    """
+    Stands in for a builder while a plan is recorded.
+    """
+    def __init__(self) -> None:
+        self.steps = []
+
+    def __getattr__(self, name: str) -> Callable[[], None]:
+        def record() -> None:
+            self.steps.append(name)
+        return record
+
+
 class Director:
     """
     This is an optional class and is responsible for executing the building
@@ -136,10 +237,52 @@ class Director:
         self.builder.produce_part_b()
         self.builder.produce_part_c()
 
+    def compile_plan(self, build: Callable[[], None]) -> BuildPlan:
+        """
+        Record the steps one of the build methods above takes, e.g.
+        `director.compile_plan(director.build_full_featured_product)`, so
+        they can be replayed by `build_many` without going through the
+        Director again.
+        """
+        builder = self._builder
+        recorder = _StepRecorder()
+        self._builder = recorder
+        try:
+            build()
+        finally:
+            self._builder = builder
+        return BuildPlan(recorder.steps)
+
+    def build_many(self, plan: BuildPlan, n: int) -> list:
+        """
+        Produce n products by replaying the plan on the current builder.
+        Builders that can build a batch themselves provide `replay`;
+        otherwise the builder's step methods are looked up once for the
+        whole batch.
+        """
+        builder = self.builder
+        replay = getattr(builder, "replay", None)
+        if replay is not None:
+            return replay(plan.steps, n)
+        steps = [getattr(builder, name) for name in plan.steps]
+        get_product = type(builder).product.fget
+        products = []
+        append = products.append
+        for _ in range(n):
+            for step in steps:
+                step()
+            append(get_product(builder))
+        return products
+
 
 # -- SPECIFIC EXAMPLE -- #
 class Computer:
+    __slots__ = ("cpu", "memory", "storage")
+
     def __init__(self):
+        self.reset()
+
+    def reset(self):
         self.cpu = None
         self.memory = None
         self.storage = None
@@ -154,9 +297,33 @@ class Computer:
         self.storage = storage_type
 
 
+class FrozenComputer(NamedTuple):
+    """
+    An immutable computer configuration; being a tuple it carries no
+    per-instance __dict__.
+    """
+    cpu: Any
+    memory: Any
+    storage: Any
+
+
+# Hash-consing: identical configurations built while they are in this
+# bounded cache are the same object. Evicted configurations are rebuilt,
+# so compare with == where identity is not guaranteed. typed=True keeps
+# equal parts of different types apart, e.g. 16 and 16.0 or 1 and True.
+# Parts are cache keys, so they must be hashable.
+_intern_computer = lru_cache(maxsize=65536, typed=True)(FrozenComputer)
+
+
 class ComputerBuilder:
-    def __init__(self):
-        self.builder = Computer()
+    def __init__(self, pool=None):
+        """
+        Without a pool, `build` returns the computer this builder keeps
+        working on. With a pool, `build` hands the computer over and the
+        builder continues with a blank one from the pool.
+        """
+        self._pool = pool
+        self.builder = Computer() if pool is None else pool.acquire()
 
     def add_cpu(self, cpu_type):
         self.builder.set_cpu(cpu_type)
@@ -171,7 +338,190 @@ class ComputerBuilder:
         return self
 
     def build(self):
-        return self.builder
+        computer = self.builder
+        if self._pool is not None:
+            self.builder = self._pool.acquire()
+        return computer
+
+    def build_frozen(self):
+        """
+        Return an immutable, interned snapshot of the configuration, which
+        later `add_*` calls do not affect. Raises TypeError if a part is
+        unhashable, e.g. a list.
+        """
+        computer = self.builder
+        try:
+            return _intern_computer(computer.cpu, computer.memory, computer.storage)
+        except TypeError as exc:
+            raise TypeError(f"cannot freeze a computer with unhashable parts: {exc}") from None
+
+
+class DeferredComputerBuilder(ComputerBuilder):
+    """
+    A builder whose parts may still be on their way: every `add_*` step
+    accepts a plain value, a concurrent.futures.Future or an awaitable,
+    e.g. a pending inventory or pricing lookup. All pending parts are
+    resolved together in `build`, so building takes as long as the slowest
+    lookup rather than the sum of all of them.
+    """
+    def __init__(self, pool=None):
+        super().__init__(pool)
+        self._parts = {}
+
+    def add_cpu(self, cpu_type):
+        self._parts["cpu"] = cpu_type
+        return self
+
+    def add_memory(self, memory_type):
+        self._parts["memory"] = memory_type
+        return self
+
+    def add_storage(self, storage_type):
+        self._parts["storage"] = storage_type
+        return self
+
+    def build(self):
+        """
+        Resolve the parts, validate them and assemble the computer. Must be
+        called outside a running event loop; use `build_async` inside one.
+        """
+        self._assemble(self._resolve())
+        return super().build()
+
+    async def build_async(self):
+        self._assemble(await self._resolve_async())
+        return super().build()
+
+    def build_frozen(self):
+        if self._parts:
+            self._assemble(self._resolve())
+        return super().build_frozen()
+
+    def _resolve(self):
+        if any(inspect.isawaitable(part) for part in self._parts.values()):
+            return asyncio.run(self._resolve_async())
+        return {name: part.result() if isinstance(part, Future) else part
+                for name, part in self._parts.items()}
+
+    async def _resolve_async(self):
+        names = list(self._parts)
+        values = await asyncio.gather(*(self._awaitable(self._parts[name]) for name in names))
+        parts = dict(zip(names, values))
+        # an awaited coroutine cannot be awaited again, so keep the values
+        # for a retry after a failed validation
+        self._parts.update(parts)
+        return parts
+
+    @staticmethod
+    async def _awaitable(part):
+        if isinstance(part, Future):
+            return await asyncio.wrap_future(part)
+        if inspect.isawaitable(part):
+            return await part
+        return part
+
+    def _assemble(self, parts):
+        missing = [name for name in ("cpu", "memory", "storage") if parts.get(name) is None]
+        if missing:
+            raise ValueError(f"cannot build a computer without: {', '.join(missing)}")
+        self._parts = {}
+        super().add_cpu(parts["cpu"])
+        super().add_memory(parts["memory"])
+        super().add_storage(parts["storage"])
+
+
+class FakeInventory:
+    """
+    A local stand-in for a slow lookup service, answering after `latency`
+    seconds.
+    """
+    def __init__(self, latency=0.2):
+        self.latency = latency
+        self._executor = ThreadPoolExecutor()
+
+    def _lookup(self, part):
+        time.sleep(self.latency)
+        return part
+
+    def lookup(self, part):
+        return self._executor.submit(self._lookup, part)
+
+    async def lookup_async(self, part):
+        await asyncio.sleep(self.latency)
+        return part
+
+
+def benchmark_interning(builds=10**7):
+    """
+    Report the memory held by a catalogue of `builds` configurations kept
+    as defensive copies of mutable computers and as interned frozen ones.
+    """
+    import tracemalloc
+
+    cpus = ["M1", "M2", "M2 Pro", "M2 Max", "M3", "i5", "i7", "i9"]
+    memories = ["8GB", "16GB", "32GB", "64GB", "96GB", "128GB"]
+    storages = ["256GB", "512GB", "1TB", "2TB", "4TB"]
+    for name, build in (("copied", lambda b: copy.copy(b.build())),
+                        ("frozen", ComputerBuilder.build_frozen)):
+        random.seed(0)
+        builder = ComputerBuilder()
+        tracemalloc.start()
+        catalogue = [build(builder.add_cpu(random.choice(cpus))
+                           .add_memory(random.choice(memories))
+                           .add_storage(random.choice(storages)))
+                     for _ in range(builds)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        distinct = len({id(computer) for computer in catalogue})
+        print(f"{name:<7} {size / 2**20:>9.1f} MiB  {distinct:>10,} distinct objects")
+        del catalogue
+
+
+def benchmark_build_plans(counts=(1, 10**6)):
+    """
+    Compare building products one at a time through the Director with
+    replaying a compiled plan in one batch.
+    """
+    director = Director()
+    director.builder = ConcreteBuilder()
+    plan = director.compile_plan(director.build_full_featured_product)
+    for n in counts:
+        start = time.perf_counter()
+        products = []
+        for _ in range(n):
+            director.build_full_featured_product()
+            products.append(director.builder.product)
+        one_by_one = time.perf_counter() - start
+        del products
+        start = time.perf_counter()
+        director.build_many(plan, n)
+        batched = time.perf_counter() - start
+        print(f"{n:>8} products  one by one {n / one_by_one:>12,.0f}/s  "
+              f"build_many {n / batched:>12,.0f}/s")
+
+
+def benchmark_pooling(products=10**6, batch=1000):
+    """
+    Compare building products in batches of `batch` live products with
+    fresh allocations and with a pool, reporting time and garbage
+    collector runs.
+    """
+    for name, pool in (("allocating", None), ("pooled", ObjectPool(Product1, batch))):
+        builder = ConcreteBuilder(pool)
+        collections = sum(stat["collections"] for stat in gc.get_stats())
+        start = time.perf_counter()
+        for _ in range(products // batch):
+            live = []
+            for _ in range(batch):
+                builder.produce_part_a()
+                builder.produce_part_b()
+                live.append(builder.product)
+            if pool is not None:
+                for product in live:
+                    pool.release(product)
+        elapsed = time.perf_counter() - start
+        collections = sum(stat["collections"] for stat in gc.get_stats()) - collections
+        print(f"{name:<11} {products / elapsed:>12,.0f} products/s  {collections} GC runs")
 
 
 if __name__ == "__main__":
@@ -199,3 +549,45 @@ if __name__ == "__main__":
             .add_storage("1TB")\
             .build()
     print(f"Result of the specific example {my_computer.cpu}")
+
+    # Frozen, interned configurations
+    computer_builder = ComputerBuilder().add_cpu("M2").add_memory("64GB").add_storage("1TB")
+    first = computer_builder.build_frozen()
+    second = ComputerBuilder().add_cpu("M2").add_memory("64GB").add_storage("1TB").build_frozen()
+    computer_builder.add_cpu("M3")
+    print(f"{first} shared: {first is second}")
+
+    # Parts resolved concurrently from a slow lookup service
+    inventory = FakeInventory(latency=0.2)
+    start = time.perf_counter()
+    deferred_computer = DeferredComputerBuilder()\
+            .add_cpu(inventory.lookup("M2"))\
+            .add_memory(inventory.lookup_async("64GB"))\
+            .add_storage(inventory.lookup("1TB"))\
+            .build()
+    elapsed = time.perf_counter() - start
+    # the lookups overlap, so building takes about one lookup, not three
+    print(f"Resolved {deferred_computer.cpu}/{deferred_computer.memory}/"
+          f"{deferred_computer.storage} in {elapsed:.2f}s "
+          f"(concurrent: {elapsed < 2 * inventory.latency})")
+
+    # Pooled mode: released products are reset and reused
+    pool = ObjectPool(Product1, maxsize=8)
+    pooled_builder = ConcreteBuilder(pool)
+    first = pooled_builder.product
+    pool.release(first)
+    pooled_builder.produce_part_c()
+    print(str(pooled_builder.product))
+    pooled_builder.produce_part_a()
+    second = pooled_builder.product
+    print(f"{second} (reused: {second is first})")
+
+    # Example 3: Replaying a compiled build plan
+    plan = director.compile_plan(director.build_full_featured_product)
+    for product in director.build_many(plan, 2):
+        print(str(product))
+
+    if "--benchmark" in sys.argv:
+        benchmark_pooling()
+        benchmark_build_plans()
+        benchmark_interning()
@@ -40,7 +40,25 @@ Applicability:
     instead of rebulding them each time.
 """
 
+import inspect
+import json
+import mmap
+import os
+import random
+import struct
+import statistics
+import sys
+import tempfile
+import time
+import timeit
 from abc import ABC, abstractmethod
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, BurgerColumn falls back to plain loops
+    np = None
 
 ##############################################################################################
 ######################################GENERAL EXAMPLE########################################
@@ -48,16 +66,31 @@ from abc import ABC, abstractmethod
 
 
 class Factory(ABC):
+    # Subclasses whose products keep no state can set this, so that
+    # some_operation creates the product once and reuses it.
+    reusable_product: bool = False
+
+    # the static part of some_operation's result, built once
+    _RESULT_PREFIX = """Depending on created products that will be more specific in subclasses,
+                     the core business result will be different"""
+
     @abstractmethod
     def factory_method(self):
         pass
 
+    def _get_product(self):
+        if not self.reusable_product:
+            return self.factory_method()
+        product = self.__dict__.get("_product")
+        if product is None:
+            product = self._product = self.factory_method()
+        return product
+
     def some_operation(self) -> str:
-        product = self.factory_method()
+        product = self._get_product()
 
         # use the product
-        result = f"""Depending on created products that will be more specific in subclasses,
-                     the core business result will be different{product.operation()}"""
+        result = self._RESULT_PREFIX + product.operation()
         return result
 
 
@@ -77,29 +110,436 @@ class ConcreteFactory1(Factory):
         return ConcreteProduct1()
 
 
+class CachedConcreteFactory1(ConcreteFactory1):
+    # ConcreteProduct1 has no state, so one instance serves every call
+    reusable_product = True
+
+
+def _all_subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _all_subclasses(subclass)
+
+
+def benchmark_some_operation(loops=10**5, repeat=5):
+    """
+    A pyperf-style microbenchmark of some_operation for every concrete
+    Factory subclass: each value is the time per call, as mean +- standard
+    deviation over `repeat` runs of `loops` calls.
+    """
+    for factory_class in _all_subclasses(Factory):
+        if inspect.isabstract(factory_class):
+            continue
+        factory = factory_class()
+        runs = [run / loops for run in timeit.repeat(factory.some_operation,
+                                                     number=loops, repeat=repeat)]
+        print(f"{factory_class.__name__}.some_operation: "
+              f"Mean +- std dev: {statistics.mean(runs) * 1e9:.0f} ns "
+              f"+- {statistics.stdev(runs) * 1e9:.0f} ns")
+
+
 ##############################################################################################
 ######################################SPECIFIC EXAMPLE########################################
 ##############################################################################################
 
 
+class IngredientVocabulary:
+    """
+    Interns ingredient names as small ints shared by every burger. Ids fit
+    in one byte.
+    """
+    max_size = 256
+
+    def __init__(self):
+        self.names = []
+        self._ids = {}
+
+    def id_of(self, name):
+        ingredient_id = self._ids.get(name)
+        if ingredient_id is None:
+            if len(self.names) >= self.max_size:
+                raise ValueError(f"more than {self.max_size} distinct ingredients")
+            ingredient_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return ingredient_id
+
+    def encode(self, ingredients):
+        return bytes(self.id_of(name) for name in ingredients)
+
+    def mask(self, ingredients):
+        """
+        The bit set of the given ingredients, or None if one of them was
+        never interned. Unlike `encode`, this does not add names.
+        """
+        mask = 0
+        for name in ingredients:
+            ingredient_id = self._ids.get(name)
+            if ingredient_id is None:
+                return None
+            mask |= 1 << ingredient_id
+        return mask
+
+
 class Burger:
+    """
+    Ingredients are stored as a bytes object of vocabulary ids, which
+    keeps their order and is shared by all burgers built from the same
+    recipe.
+    """
+    __slots__ = ("_ids",)
+    vocabulary = IngredientVocabulary()
+
     def __init__(self, ingredients):
-        self.ingredients = ingredients
+        self._ids = self.vocabulary.encode(ingredients)
+
+    @classmethod
+    def _from_ids(cls, ids):
+        burger = cls.__new__(cls)
+        burger._ids = ids
+        return burger
+
+    @property
+    def ingredients(self):
+        names = self.vocabulary.names
+        return tuple(names[i] for i in self._ids)
+
+    @property
+    def mask(self):
+        mask = 0
+        for i in self._ids:
+            mask |= 1 << i
+        return mask
 
     def print_(self):
-        return self.ingredients
+        return list(self.ingredients)
+
+    def __eq__(self, other):
+        if not isinstance(other, Burger):
+            return NotImplemented
+        return self._ids == other._ids
+
+    def __hash__(self):
+        return hash(self._ids)
+
+
+class BurgerColumn:
+    """
+    The ingredient masks of many burgers packed in one array, so questions
+    like "which burgers contain lettuce" are answered for the whole column
+    at once (with NumPy when it is installed). Each row is a bitmap of
+    `words` 64-bit words, wide enough for every id of the vocabulary.
+    """
+    words = IngredientVocabulary.max_size // 64
+
+    def __init__(self, burgers=()):
+        self._masks = array("Q")
+        for burger in burgers:
+            self.append(burger)
+
+    @classmethod
+    def _split(cls, mask):
+        return [(mask >> (64 * word)) & 0xFFFFFFFFFFFFFFFF for word in range(cls.words)]
+
+    def append(self, burger):
+        self._masks.extend(self._split(burger.mask))
+
+    def __len__(self):
+        return len(self._masks) // self.words
+
+    def _rows(self):
+        if np is not None:
+            return np.frombuffer(self._masks, dtype=np.uint64).reshape(-1, self.words)
+        masks = self._masks
+        return [masks[i:i + self.words] for i in range(0, len(masks), self.words)]
+
+    def containing(self, *ingredients):
+        """
+        Indices of the burgers that contain all the given ingredients.
+        """
+        query = Burger.vocabulary.mask(ingredients)
+        if query is None:
+            return []
+        query = self._split(query)
+        if np is not None:
+            query = np.array(query, dtype=np.uint64)
+            return np.flatnonzero(((self._rows() & query) == query).all(axis=1)).tolist()
+        return [i for i, row in enumerate(self._rows())
+                if all(word & q == q for word, q in zip(row, query))]
+
+    def count(self, ingredient):
+        query = Burger.vocabulary.mask([ingredient])
+        if query is None:
+            return 0
+        query = self._split(query)
+        if np is not None:
+            query = np.array(query, dtype=np.uint64)
+            return int(np.count_nonzero((self._rows() & query).any(axis=1)))
+        return sum(1 for row in self._rows() if any(word & q for word, q in zip(row, query)))
+
+
+# magic, length of the JSON header that follows
+_ORDERS_HEADER = struct.Struct("<4sI")
+
+
+class BurgerOrders:
+    """
+    A columnar store of burger orders: every row holds the id of its
+    recipe, i.e. of its encoded ingredients. BurgerFactory.order writes
+    whole batches straight into the column without creating Burger
+    objects. Aggregations and ingredient queries are answered per recipe
+    first and then spread over the rows (with NumPy when it is installed),
+    so any ingredient of the vocabulary can be queried.
+    """
+    # the column layout changed from "BORD" files, which also held masks
+    MAGIC = b"BOR2"
+
+    def __init__(self):
+        self._recipe_ids = array("H")
+        # recipe id -> encoded ingredients, display name and ingredient mask
+        self._recipes = []
+        self.recipe_names = []
+        self._recipe_masks = []
+        self._recipe_index = {}
+
+    def _recipe_id(self, ids, name=None):
+        recipe_id = self._recipe_index.get(ids)
+        if recipe_id is None:
+            recipe_id = self._recipe_index[ids] = len(self._recipes)
+            self._recipes.append(ids)
+            self.recipe_names.append(name or ", ".join(Burger._from_ids(ids).ingredients))
+            self._recipe_masks.append(Burger._from_ids(ids).mask)
+        return recipe_id
+
+    def __len__(self):
+        return len(self._recipe_ids)
+
+    def add(self, ids, n=1, name=None):
+        """
+        Append n orders of the burger encoded as `ids`.
+        """
+        recipe_id = self._recipe_id(ids, name)
+        self._recipe_ids.extend(array("H", [recipe_id]) * n)
+
+    def append(self, burger):
+        self.add(burger._ids)
+
+    def _recipe_counts(self):
+        if np is not None:
+            recipe_ids = np.frombuffer(self._recipe_ids, dtype=np.uint16)
+            return np.bincount(recipe_ids, minlength=len(self._recipes)).tolist()
+        tally = Counter(self._recipe_ids)
+        return [tally[recipe_id] for recipe_id in range(len(self._recipes))]
+
+    def group_by_recipe(self):
+        return dict(zip(self.recipe_names, self._recipe_counts()))
+
+    def _matching_recipes(self, ingredients):
+        # the ids of the recipes that contain all the given ingredients
+        query = Burger.vocabulary.mask(ingredients)
+        if query is None:
+            return []
+        return [recipe_id for recipe_id, mask in enumerate(self._recipe_masks)
+                if mask & query == query]
+
+    def containing(self, *ingredients):
+        """
+        Indices of the orders that contain all the given ingredients.
+        """
+        matching = self._matching_recipes(ingredients)
+        if not matching:
+            return []
+        if np is not None:
+            recipe_ids = np.frombuffer(self._recipe_ids, dtype=np.uint16)
+            return np.flatnonzero(np.isin(recipe_ids, matching)).tolist()
+        matching = set(matching)
+        return [i for i, recipe_id in enumerate(self._recipe_ids) if recipe_id in matching]
+
+    def count(self, ingredient):
+        counts = self._recipe_counts()
+        return sum(counts[recipe_id] for recipe_id in self._matching_recipes([ingredient]))
+
+    def ingredient_counts(self):
+        """
+        How many of every ingredient the orders use, repeated ingredients
+        included, e.g. for restocking.
+        """
+        names = Burger.vocabulary.names
+        counts = Counter()
+        for ids, n in zip(self._recipes, self._recipe_counts()):
+            for ingredient_id in ids:
+                counts[names[ingredient_id]] += n
+        return dict(counts)
+
+    def export(self, path):
+        """
+        Write the column to `path` straight from its buffer, preceded by a
+        JSON header, so that `load` can map it back without copying.
+        """
+        header = json.dumps({
+            "vocabulary": Burger.vocabulary.names,
+            "recipes": [list(ids) for ids in self._recipes],
+            "names": self.recipe_names,
+            "rows": len(self),
+        }).encode()
+        # the column starts 8-byte aligned
+        header += b" " * (-(_ORDERS_HEADER.size + len(header)) % 8)
+        with open(path, "wb") as f:
+            f.write(_ORDERS_HEADER.pack(self.MAGIC, len(header)))
+            f.write(header)
+            f.write(self._recipe_ids)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Map an exported file. The column is a read-only view of the
+        mapping, so nothing is read until it is used and orders cannot be
+        added to the result. Recipes are re-encoded with this process's
+        vocabulary, so the ingredient ids may differ from the exporter's.
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = _ORDERS_HEADER.unpack_from(mapped)
+        if magic != cls.MAGIC:
+            raise ValueError(f"{path} is not an exported BurgerOrders file")
+        offset = _ORDERS_HEADER.size + header_length
+        header = json.loads(mapped[_ORDERS_HEADER.size:offset])
+        rows = header["rows"]
+        orders = cls()
+        names = header["vocabulary"]
+        for ids, name in zip(header["recipes"], header["names"]):
+            orders._recipe_id(Burger.vocabulary.encode(names[i] for i in ids), name)
+        orders._recipe_ids = memoryview(mapped)[offset:offset + 2 * rows].cast("H")
+        return orders
 
 
 class BurgerFactory:
+    """
+    Recipes are registered once, by name, and stored encoded in a form
+    that every burger of that recipe shares, so creating a burger does not
+    build a new ingredients list and adding a recipe needs no new method.
+    """
+    # recipe name -> shared, encoded ingredients
+    _recipes = {}
+
+    @classmethod
+    def register_recipe(cls, name, ingredients):
+        cls._recipes[name] = Burger.vocabulary.encode(ingredients)
+
+    def create(self, recipe):
+        return Burger._from_ids(self._recipes[recipe])
+
+    def create_many(self, recipe, n):
+        ids = self._recipes[recipe]
+        from_ids = Burger._from_ids
+        return [from_ids(ids) for _ in range(n)]
+
+    def order(self, recipe, n, orders):
+        """
+        Write n burgers of a recipe straight into a BurgerOrders store.
+        """
+        orders.add(self._recipes[recipe], n, recipe)
+
     def create_cheese_burger(self):
-        ingredients = ["bun", "cheese", "beef-patty"]
-        return Burger(ingredients)
+        return self.create("cheese_burger")
 
     def create_deluxe_cheese_burger(self):
-        ingredients = ["bun", "tomatoe", "lettuce", "cheese", "beef-patty"]
-        return Burger(ingredients)
+        return self.create("deluxe_cheese_burger")
+
+
+BurgerFactory.register_recipe("cheese_burger", ["bun", "cheese", "beef-patty"])
+BurgerFactory.register_recipe("deluxe_cheese_burger",
+                              ["bun", "tomatoe", "lettuce", "cheese", "beef-patty"])
+
+
+def benchmark_burgers(n=10**6):
+    """
+    Compare time and memory per burger of building every burger from its
+    ingredient names with the registry's shared recipes.
+    """
+    import tracemalloc
+
+    factory = BurgerFactory()
+    approaches = (
+        ("from names", lambda: [Burger(["bun", "tomatoe", "lettuce", "cheese", "beef-patty"])
+                                     for _ in range(n)]),
+        ("create", lambda: [factory.create("deluxe_cheese_burger") for _ in range(n)]),
+        ("create_many", lambda: factory.create_many("deluxe_cheese_burger", n)),
+    )
+    for name, build in approaches:
+        start = time.perf_counter()
+        burgers = build()
+        elapsed = time.perf_counter() - start
+        del burgers
+        tracemalloc.start()
+        burgers = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del burgers
+        print(f"{name:<16} {elapsed / n * 1e9:6.0f}ns/burger  {size / n:6.1f} bytes/burger")
+
+
+def benchmark_orders(n=10**7, batch=100, path=None):
+    """
+    Fill a BurgerOrders store with n orders in batches of random recipes,
+    aggregate and export it, and compare with counting ingredients over
+    a list of Burger objects.
+    """
+    factory = BurgerFactory()
+    recipes = list(BurgerFactory._recipes)
+    random.seed(0)
+    batches = [random.choice(recipes) for _ in range(n // batch)]
+    path = path or os.path.join(tempfile.mkdtemp(), "orders.bin")
+
+    orders = BurgerOrders()
+    start = time.perf_counter()
+    for recipe in batches:
+        factory.order(recipe, batch, orders)
+    filled = time.perf_counter() - start
+    start = time.perf_counter()
+    orders.ingredient_counts()
+    orders.group_by_recipe()
+    aggregated = time.perf_counter() - start
+    start = time.perf_counter()
+    orders.export(path)
+    exported = time.perf_counter() - start
+    print(f"columnar  fill {filled:.3f}s  aggregate {aggregated:.4f}s  export {exported:.3f}s")
+    del orders
+
+    burgers = []
+    start = time.perf_counter()
+    for recipe in batches:
+        burgers.extend(factory.create_many(recipe, batch))
+    filled = time.perf_counter() - start
+    start = time.perf_counter()
+    counts = Counter()
+    for burger in burgers:
+        counts.update(burger.ingredients)
+    aggregated = time.perf_counter() - start
+    print(f"objects   fill {filled:.3f}s  aggregate {aggregated:.4f}s")
 
 
 if __name__ == "__main__":
     print(BurgerFactory().create_cheese_burger().print_())
     print(BurgerFactory().create_deluxe_cheese_burger().print_())
+
+    BurgerFactory.register_recipe("veggie_burger", ["bun", "lettuce", "tomatoe", "veggie-patty"])
+    print([burger.print_() for burger in BurgerFactory().create_many("veggie_burger", 2)])
+
+    orders = [BurgerFactory().create_cheese_burger(),
+              BurgerFactory().create_deluxe_cheese_burger(),
+              BurgerFactory().create("veggie_burger")]
+    column = BurgerColumn(orders)
+    print(f"Burgers with lettuce: {column.containing('lettuce')}, "
+          f"with cheese: {column.count('cheese')}")
+    print(orders[0] == Burger(["bun", "cheese", "beef-patty"]))
+
+    burger_orders = BurgerOrders()
+    BurgerFactory().order("cheese_burger", 3, burger_orders)
+    BurgerFactory().order("deluxe_cheese_burger", 2, burger_orders)
+    print(burger_orders.group_by_recipe())
+    print(burger_orders.ingredient_counts())
+
+    if "--benchmark" in sys.argv:
+        benchmark_burgers()
+        benchmark_orders()
+        benchmark_some_operation()
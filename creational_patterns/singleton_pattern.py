@@ -23,19 +23,316 @@ Implementation:
     - implement a static creation method.
 
 """
+import ctypes
+import mmap
+import multiprocessing
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import weakref
+from concurrent.futures import Future
 
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows
+    fcntl = None
 
-class ApplicationState:
-    instance = None
+
+# every singleton class, so their locks can be replaced in a forked child
+_singleton_classes = weakref.WeakSet()
+
+
+def _reinit_locks_after_fork():
+    # a lock held by another thread at fork time would never be released
+    # in the child, as that thread does not exist there
+    for cls in _singleton_classes:
+        cls._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reinit_locks_after_fork)
+
+
+class SingletonMeta(type):
+    """
+    A reusable singleton: any class using this metaclass returns the same
+    instance from every constructor call.
+
+    The first calls are serialized with double-checked locking, so threads
+    racing on first use cannot build two instances. Once the instance
+    exists, the accessor only reads a class attribute and never takes the
+    lock.
+    """
+    def __init__(cls, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        cls.instance = None
+        cls._lock = threading.Lock()
+        _singleton_classes.add(cls)
+
+    def __call__(cls, *args, **kwargs):
+        instance = cls.instance
+        if instance is None:
+            with cls._lock:
+                instance = cls.instance
+                if instance is None:
+                    instance = super().__call__(*args, **kwargs)
+                    cls.instance = instance
+        return instance
+
+    def preload(cls, *args, **kwargs):
+        """
+        Build the instance in a background thread, for classes with an
+        expensive initialization. Callers that need the instance before it
+        is ready simply wait on the lock; the returned future resolves to
+        the instance.
+        """
+        future = Future()
+
+        def build():
+            try:
+                future.set_result(cls(*args, **kwargs))
+            except BaseException as exc:
+                future.set_exception(exc)
+
+        threading.Thread(target=build, daemon=True).start()
+        return future
+
+
+# magic, format version, number of fields
+_SNAPSHOT_HEADER = struct.Struct("<4sHH")
+# field name length, value offset, value length
+_SNAPSHOT_ENTRY = struct.Struct("<HII")
+
+
+class ApplicationState(metaclass=SingletonMeta):
+    """
+    The state can be saved to a binary snapshot and restored from it at
+    startup instead of being rebuilt. A snapshot holds an index of fields
+    followed by their pickled values; restoring only reads the index, and
+    each value is unpickled on first access.
+    """
+    SNAPSHOT_MAGIC = b"APST"
+    # bump whenever the fields change in an incompatible way
+    SNAPSHOT_VERSION = 1
 
     def __init__(self):
         self.is_logged_in = False
 
+    @staticmethod
+    def getAppState(snapshot=None):
+        """
+        Restore the state from `snapshot` when it is given and readable,
+        otherwise build it from scratch.
+        """
+        if snapshot is not None and ApplicationState.instance is None:
+            try:
+                return ApplicationState.from_snapshot(snapshot)
+            except (OSError, ValueError, struct.error):
+                pass
+        return ApplicationState()
+
+    def __getattr__(self, name):
+        # only called for attributes that are not loaded yet
+        lazy = self.__dict__.get("_lazy_fields")
+        if not lazy or name not in lazy:
+            raise AttributeError(name)
+        with type(self)._lock:
+            # another thread may have loaded it while we waited
+            if name in self.__dict__:
+                return self.__dict__[name]
+            offset, length = lazy[name]
+            value = pickle.loads(self._snapshot[offset:offset + length])
+            setattr(self, name, value)
+            del lazy[name]
+        return value
+
+    def save_snapshot(self, path):
+        names = [name for name in vars(self) if not name.startswith("_")]
+        names += self.__dict__.get("_lazy_fields", {})
+        values = [pickle.dumps(getattr(self, name), pickle.HIGHEST_PROTOCOL)
+                  for name in names]
+        encoded = [name.encode() for name in names]
+        offset = (_SNAPSHOT_HEADER.size + _SNAPSHOT_ENTRY.size * len(names)
+                  + sum(map(len, encoded)))
+        parts = [_SNAPSHOT_HEADER.pack(self.SNAPSHOT_MAGIC, self.SNAPSHOT_VERSION, len(names))]
+        for name, value in zip(encoded, values):
+            parts.append(_SNAPSHOT_ENTRY.pack(len(name), offset, len(value)) + name)
+            offset += len(value)
+        parts.extend(values)
+        # write a sibling file and rename it over the old snapshot, so a
+        # crash mid-write never leaves a truncated snapshot behind
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(b"".join(parts))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """
+        Install the state saved in `path` as the instance. If the instance
+        already exists, it wins: the file is not read and the existing
+        instance is returned. Raises ValueError for files that are not
+        snapshots of the current version and struct.error for truncated
+        ones.
+        """
+        if cls.instance is not None:
+            return cls.instance
+        with open(path, "rb") as f:
+            snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = _SNAPSHOT_HEADER.unpack_from(snapshot)
+        if magic != cls.SNAPSHOT_MAGIC or version != cls.SNAPSHOT_VERSION:
+            raise ValueError(f"{path} is not a version {cls.SNAPSHOT_VERSION} snapshot")
+        lazy_fields = {}
+        position = _SNAPSHOT_HEADER.size
+        for _ in range(count):
+            name_length, offset, length = _SNAPSHOT_ENTRY.unpack_from(snapshot, position)
+            position += _SNAPSHOT_ENTRY.size
+            name = snapshot[position:position + name_length].decode()
+            position += name_length
+            lazy_fields[name] = (offset, length)
+        with cls._lock:
+            if cls.instance is None:
+                instance = cls.__new__(cls)
+                instance._snapshot = snapshot
+                instance._lazy_fields = lazy_fields
+                cls.instance = instance
+            else:
+                # another thread installed an instance meanwhile
+                snapshot.close()
+        return cls.instance
+
+
+class _SharedStateMeta(type(ctypes.Structure), SingletonMeta):
+    pass
+
+
+class SharedApplicationState(ctypes.Structure, metaclass=_SharedStateMeta):
+    """
+    An application state whose fields live in a shared mmap, so every
+    pre-forked worker sees the same values. Create it before forking; pass
+    `path` to back it by a file that unrelated processes can map too.
+
+    Fields are ctypes fields, so reading one is a C-level attribute access
+    on the mapped memory. Each field is naturally aligned and written in a
+    single store; use `update` to change several fields atomically with
+    respect to other `update` calls. Forked children share the update
+    lock; processes that only share the file are serialized with an
+    fcntl lock on it, which is only available on Unix.
+    """
+    _fields_ = [("is_logged_in", ctypes.c_bool)]
+
+    def __new__(cls, path=None):
+        size = ctypes.sizeof(cls)
+        if path is None:
+            # anonymous mappings are shared with children after fork
+            buffer = mmap.mmap(-1, size)
+        else:
+            with open(path, "a+b") as f:
+                if os.path.getsize(path) < size:
+                    f.truncate(size)
+                buffer = mmap.mmap(f.fileno(), size)
+        return cls.from_buffer(buffer)
+
+    def __init__(self, path=None):
+        # a semaphore inherited across fork, unlike threading locks
+        self._update_lock = multiprocessing.Lock()
+        # kept open for the fcntl lock, which is released with its file
+        self._file = open(path, "r+b") if path is not None and fcntl is not None else None
+
     @staticmethod
     def getAppState():
-        if not ApplicationState.instance:
-            ApplicationState.instance = ApplicationState()
-        return ApplicationState.instance
+        return SharedApplicationState()
+
+    def update(self, **values):
+        with self._update_lock:
+            if self._file is not None:
+                fcntl.lockf(self._file, fcntl.LOCK_EX)
+            try:
+                for name, value in values.items():
+                    setattr(self, name, value)
+            finally:
+                if self._file is not None:
+                    fcntl.lockf(self._file, fcntl.LOCK_UN)
+
+
+def benchmark_shared_access(number=10**6):
+    """
+    Compare read and write latency of the plain attribute with the shared
+    memory field.
+    """
+    for state in (ApplicationState.getAppState(), SharedApplicationState.getAppState()):
+        name = type(state).__name__
+        read = timeit.timeit(lambda: state.is_logged_in, number=number)
+        write = timeit.timeit(lambda: setattr(state, "is_logged_in", True), number=number)
+        print(f"{name:<24} read {read / number * 1e9:.0f}ns  write {write / number * 1e9:.0f}ns")
+
+
+class _CatalogueState(ApplicationState):
+    def __init__(self):
+        super().__init__()
+        self.catalogue = {f"item-{i}": i * 0.5 for i in range(10**6)}
+
+
+def benchmark_startup(path=None):
+    """
+    Time getting a state with an expensive field from scratch, from a
+    snapshot, and from a snapshot with every field touched.
+    """
+    path = path or os.path.join(tempfile.mkdtemp(), "state.snapshot")
+    start = time.perf_counter()
+    state = _CatalogueState()
+    print(f"{'from scratch':<20} {time.perf_counter() - start:.4f}s")
+    state.save_snapshot(path)
+    for touch in (False, True):
+        _CatalogueState.instance = None
+        start = time.perf_counter()
+        state = _CatalogueState.from_snapshot(path)
+        if touch:
+            state.catalogue
+        label = "snapshot, all fields" if touch else "snapshot, lazy"
+        print(f"{label:<20} {time.perf_counter() - start:.4f}s")
+
+
+def benchmark_contention(threads=64, calls=10**5):
+    """
+    Let `threads` threads hammer the accessor at once, comparing the lock-
+    free fast path with an accessor that takes the lock on every call.
+    """
+    lock = threading.Lock()
+
+    def locked_accessor():
+        with lock:
+            return ApplicationState.getAppState()
+
+    for name, accessor in (("lock-free", ApplicationState.getAppState),
+                           ("always locked", locked_accessor)):
+        barrier = threading.Barrier(threads + 1)
+
+        def hammer():
+            barrier.wait()
+            for _ in range(calls):
+                accessor()
+
+        workers = [threading.Thread(target=hammer) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<14} {threads * calls / elapsed:>14,.0f} calls/s")
 
 
 if __name__ == '__main__':
@@ -47,3 +344,16 @@ if __name__ == '__main__':
 
     print(f"[INFO] {app_state1.is_logged_in}")
     print(f"[INFO] {app_state2.is_logged_in}")
+
+    if hasattr(os, "fork"):
+        shared_state = SharedApplicationState.getAppState()
+        worker = multiprocessing.get_context("fork").Process(
+            target=shared_state.update, kwargs={"is_logged_in": True})
+        worker.start()
+        worker.join()
+        print(f"[INFO] shared state after worker login: {shared_state.is_logged_in}")
+
+    if "--benchmark" in sys.argv:
+        benchmark_contention()
+        benchmark_shared_access()
+        benchmark_startup()